@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def get_cache_path(filename):
+    filename = Path(filename)
+    return filename.with_name(filename.name + ".npy")
+
+
+def get_stamp(filename, usecols):
+    # size and mtime of the source and the requested columns: any change, forward
+    # or back in time, is a mismatch
+    stat = os.stat(filename)
+    return repr((stat.st_size, stat.st_mtime_ns, tuple(usecols)))
+
+
+def build_cache(filename, cache, usecols, chunksize):
+    # the requested columns of the CSV are parsed chunk by chunk into a raw float64
+    # file, then laid out column by column so that every channel column is one
+    # contiguous row; the intermediate files are removed whether or not the build
+    # succeeds. Requested columns missing from the file are skipped
+    raw = cache.with_name(cache.name + ".raw")
+    temp = cache.with_name(cache.name + ".tmp")
+    stamp = get_stamp(filename, usecols)
+    try:
+        count = 0
+        with open(raw, "wb") as f:
+            for chunk in pd.read_csv(
+                filename, sep=";", encoding="cp1251", usecols=lambda name: name in usecols, chunksize=chunksize
+            ):
+                columns = list(chunk.columns)
+                for column in columns:
+                    if not pd.api.types.is_numeric_dtype(chunk[column]):
+                        raise ValueError("{}: column {} is not numeric".format(filename, column))
+                chunk.to_numpy(dtype=np.float64).tofile(f)
+                count += len(chunk)
+        if count == 0:
+            raise ValueError("{} has no rows".format(filename))
+        if not columns:
+            raise ValueError("{} has none of the columns {}".format(filename, ", ".join(usecols)))
+
+        rows = np.memmap(raw, dtype=np.float64, mode="r", shape=(count, len(columns)))
+        data = np.lib.format.open_memmap(temp, mode="w+", dtype=np.float64, shape=(len(columns), count))
+        for start in range(0, count, chunksize):
+            data[:, start : start + chunksize] = rows[start : start + chunksize].T
+        data.flush()
+        del data, rows
+        os.replace(temp, cache)
+
+        # written last: the stamp only matches once the cache itself is in place
+        with open(cache.with_name(cache.name + ".columns"), "w", encoding="utf-8") as f:
+            print("\n".join([stamp] + columns), file=f)
+    finally:
+        for path in (raw, temp):
+            if path.exists():
+                os.remove(path)
+
+
+def read_columns(cache):
+    # stamp of the source the cache was built from and the cached column names
+    path = cache.with_name(cache.name + ".columns")
+    if not cache.exists() or not path.exists():
+        return None, []
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    return (lines[0], lines[1:]) if lines else (None, [])
+
+
+def read_channel(filename, usecols=("mB", "mA"), chunksize=10 ** 6):
+    # the usecols columns of a ';'-separated cp1251 recording as float64 arrays
+    # mapped from a cache next to the source; the cache is rebuilt whenever the
+    # source's size or mtime or the requested columns differ from the ones it was
+    # built from
+    cache = get_cache_path(filename)
+    stamp, columns = read_columns(cache)
+    if stamp != get_stamp(filename, usecols):
+        build_cache(filename, cache, usecols, chunksize)
+        stamp, columns = read_columns(cache)
+    data = np.load(cache, mmap_mode="r")
+    return {column: data[i] for i, column in enumerate(columns)}
@@ -0,0 +1,9 @@
+import numpy as np
+
+
+def jaccard(lower, upper):
+    # Jaccard coefficient of the intervals [lower, upper] along the last axis:
+    # width of their intersection over the width of their hull
+    return (np.min(upper, axis=-1) - np.max(lower, axis=-1)) / (
+        np.max(upper, axis=-1) - np.min(lower, axis=-1)
+    )
@@ -3,92 +3,136 @@ import pathlib
 import seaborn
 import numpy as np
 import scipy.stats as sps
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
+# one Agg canvas per process, cleared and reused for every figure it renders
+figure = None
 
-def normal(sizes=(10, 50, 1000)):
+
+def get_figure():
+    global figure
+    if figure is None:
+        figure = Figure(figsize=(15, 5))
+        FigureCanvasAgg(figure)
+    figure.clear()
+    return figure
+
+
+def save(fig, filename):
+    fig.savefig(pathlib.Path(filename))
+    fig.clear()
+
+
+def normal(sizes=(10, 50, 1000), filename="../images/histogram/normal.png"):
     grid = np.linspace(-3, 3, 1000)
-    plt.figure(figsize=(15, 5)).suptitle(r"Случайная величина $\xi \sim \mathcal{N}(0, 1)$")
+    fig = get_figure()
+    fig.suptitle(r"Случайная величина $\xi \sim \mathcal{N}(0, 1)$")
 
     for i in range(len(sizes)):
         distribution = np.random.standard_normal(size=sizes[i])
-        plt.subplot(1, 3, i + 1)
-        plt.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
-        plt.plot(grid, sps.norm.pdf(grid), color="red", lw=3, label="Плотность случайной величины")
-        plt.title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
+        ax = fig.add_subplot(1, 3, i + 1)
+        ax.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
+        ax.plot(grid, sps.norm.pdf(grid), color="red", lw=3, label="Плотность случайной величины")
+        ax.set_title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
 
-    plt.legend(fontsize=10, loc=1)
-    plt.savefig(pathlib.Path("../images/histogram/normal.png"))
+    ax.legend(fontsize=10, loc=1)
+    save(fig, filename)
 
 
-def cauchy(sizes=(10, 50, 1000)):
+def cauchy(sizes=(10, 50, 1000), filename="../images/histogram/cauchy.png"):
     grid = np.linspace(-30, 30, 1000)
-    plt.figure(figsize=(15, 5)).suptitle(r"Случайная величина $\xi \sim \mathcal{C}(0, 1)$")
+    fig = get_figure()
+    fig.suptitle(r"Случайная величина $\xi \sim \mathcal{C}(0, 1)$")
 
     for i in range(len(sizes)):
         distribution = sps.cauchy.rvs(loc=0, scale=1, size=sizes[i])
-        plt.subplot(1, 3, i + 1)
-        plt.xlim([-10, 10])
-        seaborn.histplot(distribution, kde=False, stat="density", label="samples")
-        plt.plot(grid, sps.cauchy.pdf(grid), color="red", lw=3, label="Плотность случайной величины")
-        plt.title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
+        ax = fig.add_subplot(1, 3, i + 1)
+        ax.set_xlim([-10, 10])
+        seaborn.histplot(distribution, kde=False, stat="density", label="samples", ax=ax)
+        ax.plot(grid, sps.cauchy.pdf(grid), color="red", lw=3, label="Плотность случайной величины")
+        ax.set_title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
 
-    plt.legend(fontsize=10, loc=1)
-    plt.savefig(pathlib.Path("../images/histogram/cauchy.png"))
+    ax.legend(fontsize=10, loc=1)
+    save(fig, filename)
 
 
-def laplace(sizes=(10, 50, 1000)):
+def laplace(sizes=(10, 50, 1000), filename="../images/histogram/laplace.png"):
     grid = np.linspace(-3, 3, 1000)
-    plt.figure(figsize=(15, 5)).suptitle(r"Случайная величина $\xi \sim \mathcal{L}(0, 1/\sqrt{2})$")
+    fig = get_figure()
+    fig.suptitle(r"Случайная величина $\xi \sim \mathcal{L}(0, 1/\sqrt{2})$")
 
     for i in range(len(sizes)):
         distribution = np.random.laplace(loc=0, scale=1.0 / np.sqrt(2.0), size=sizes[i])
-        plt.subplot(1, 3, i + 1)
-        plt.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
-        plt.plot(grid, sps.laplace.pdf(grid, loc=0, scale=1.0 / np.sqrt(2.0)), color="red", lw=3,
-                 label="Плотность случайной величины")
-        plt.title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
+        ax = fig.add_subplot(1, 3, i + 1)
+        ax.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
+        ax.plot(grid, sps.laplace.pdf(grid, loc=0, scale=1.0 / np.sqrt(2.0)), color="red", lw=3,
+                label="Плотность случайной величины")
+        ax.set_title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
 
-    plt.legend(fontsize=10, loc=1)
-    plt.savefig(pathlib.Path("../images/histogram/laplace.png"))
+    ax.legend(fontsize=10, loc=1)
+    save(fig, filename)
 
 
-def poisson(sizes=(10, 50, 1000)):
+def poisson(sizes=(10, 50, 1000), filename="../images/histogram/poisson.png"):
     grid = np.linspace(0, 20, 1000)
-    plt.figure(figsize=(15, 5)).suptitle(r"Случайная величина $\xi \sim \mathcal{P}(10)$")
+    fig = get_figure()
+    fig.suptitle(r"Случайная величина $\xi \sim \mathcal{P}(10)$")
 
     for i in range(len(sizes)):
         distribution = np.random.poisson(lam=10, size=sizes[i])
-        plt.subplot(1, 3, i + 1)
-        plt.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
+        ax = fig.add_subplot(1, 3, i + 1)
+        ax.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
         y = [(10 ** x * np.exp(-10) / math.gamma(x + 1)) for x in grid]
-        plt.plot(grid, y, color="red", lw=3, label="Плотность случайной величины")
-        plt.title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
+        ax.plot(grid, y, color="red", lw=3, label="Плотность случайной величины")
+        ax.set_title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
 
-    plt.legend(fontsize=10, loc=1)
-    plt.savefig(pathlib.Path("../images/histogram/poisson.png"))
+    ax.legend(fontsize=10, loc=1)
+    save(fig, filename)
 
 
-def uniform(sizes=(10, 50, 1000)):
+def uniform(sizes=(10, 50, 1000), filename="../images/histogram/uniform.png"):
     grid = np.linspace(-3, 3, 1000)
-    plt.figure(figsize=(15, 5)).suptitle(r"Случайная величина $\xi \sim \mathcal{U}(-\sqrt{3}, \sqrt{3})$")
+    fig = get_figure()
+    fig.suptitle(r"Случайная величина $\xi \sim \mathcal{U}(-\sqrt{3}, \sqrt{3})$")
 
     for i in range(len(sizes)):
         distribution = np.random.uniform(low=-np.sqrt(3.0), high=np.sqrt(3.0), size=sizes[i])
-        plt.subplot(1, 3, i + 1)
-        plt.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
-        plt.plot(grid, sps.uniform.pdf(grid, loc=-np.sqrt(3.0), scale=2 * np.sqrt(3.0)), color="red", lw=3,
-                 label="Плотность случайной величины")
-        plt.title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
+        ax = fig.add_subplot(1, 3, i + 1)
+        ax.hist(distribution, bins=30, density=True, alpha=0.6, label="Гистограмма выборки")
+        ax.plot(grid, sps.uniform.pdf(grid, loc=-np.sqrt(3.0), scale=2 * np.sqrt(3.0)), color="red", lw=3,
+                label="Плотность случайной величины")
+        ax.set_title(f"\nРазмер выборки: {sizes[i]}", fontsize=10)
 
-    plt.legend(fontsize=10, loc=1)
-    plt.savefig(pathlib.Path("../images/histogram/uniform.png"))
+    ax.legend(fontsize=10, loc=1)
+    save(fig, filename)
 
 
-if __name__ == "__main__":
-    normal()
-    cauchy()
-    laplace()
-    poisson()
-    uniform()
+PLOTS = {
+    "normal": normal,
+    "cauchy": cauchy,
+    "laplace": laplace,
+    "poisson": poisson,
+    "uniform": uniform,
+}
 
+
+def render(job):
+    # job is (name, sizes, filename, seed); every job reseeds the global state so
+    # forked workers do not draw the same samples
+    name, sizes, filename, seed = job
+    np.random.seed(seed)
+    PLOTS[name](sizes, filename)
+    return filename
+
+
+def render_all(jobs, workers=None, seed=None):
+    # jobs is a list of (name, sizes, filename)
+    seeds = np.random.SeedSequence(seed).generate_state(len(jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render, [(*job, s) for job, s in zip(jobs, seeds)]))
+
+
+if __name__ == "__main__":
+    render_all([(name, (10, 50, 1000), f"../images/histogram/{name}.png") for name in PLOTS])
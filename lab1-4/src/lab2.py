@@ -1,93 +1,189 @@
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 
-def get_characteristics(generator, sample_size):
-    iters = 1000
-    cs = dict()
-    for num in sample_size:
-        cs[num] = dict()
-        mean = []
-        median = []
-        z_r = []
-        z_q = []
-        z_tr = []
-        for _ in range(iters):
-            data = generator(num)
-            data.sort()
-
-            mean.append(data.mean())
-            median.append(np.median(data))
-            z_r.append((data[0] + data[-1]) / 2)
-            z_q.append((np.quantile(data, 0.25) + np.quantile(data, 0.75)) / 2)
-            r = num // 4
-            z_tr.append(sum(data[r:-r]) / (num - 2 * r))
-
-        cs[num]["mean"] = round(np.mean(mean), 4)
-        cs[num]["median"] = round(np.mean(median), 4)
-        cs[num]["z_R"] = round(np.mean(z_r), 4)
-        cs[num]["z_Q"] = round(np.mean(z_q), 4)
-        cs[num]["z_tr"] = round(np.mean(z_tr), 4)
-        cs[num]["d_mean"] = round(np.std(mean) ** 2, 4)
-        cs[num]["d_median"] = round(np.std(median) ** 2, 4)
-        cs[num]["d_z_R"] = round(np.std(z_r) ** 2, 4)
-        cs[num]["d_z_Q"] = round(np.std(z_q) ** 2, 4)
-        cs[num]["d_z_tr"] = round(np.std(z_tr) ** 2, 4)
-
-        cs[num]["mean+"] = (
-                "["
-                + str(round(np.mean(mean) - np.std(mean), 4))
-                + "; "
-                + str(round(np.mean(mean) + np.std(mean), 4))
-                + "]"
-        )
-        cs[num]["median+"] = (
-                "["
-                + str(round(np.mean(median) - np.std(median), 4))
-                + "; "
-                + str(round(np.mean(median) + np.std(median), 4))
-                + "]"
-        )
-        cs[num]["z_R+"] = (
-                "["
-                + str(round(np.mean(z_r) - np.std(z_r), 4))
-                + "; "
-                + str(round(np.mean(z_r) + np.std(z_r), 4))
-                + "]"
-        )
-        cs[num]["z_Q+"] = (
-                "["
-                + str(round(np.mean(z_q) - np.std(z_q), 4))
-                + "; "
-                + str(round(np.mean(z_q) + np.std(z_q), 4))
-                + "]"
-        )
-        cs[num]["z_tr+"] = (
+ESTIMATORS = ("mean", "median", "z_R", "z_Q", "z_tr")
+
+
+class Accumulator:
+    # running count, mean and sum of squared deviations (Welford / Chan et al.)
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def merge(self, other):
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return self
+        mean = values.mean()
+        return self.merge(Accumulator(values.size, mean, np.sum((values - mean) ** 2)))
+
+    @property
+    def variance(self):
+        return self.m2 / self.count
+
+
+def get_quantile_ranks(num, q):
+    # linear interpolation between order statistics, as np.quantile does by default
+    h = (num - 1) * q
+    lo = int(np.floor(h))
+    return lo, min(lo + 1, num - 1), h - lo
+
+
+def get_ranks(num):
+    # every order statistic the estimators read
+    r = num // 4
+    ranks = {0, num - 1, (num - 1) // 2, num // 2, r, num - r - 1}
+    for q in (0.25, 0.75):
+        ranks.update(get_quantile_ranks(num, q)[:2])
+    return sorted(ranks)
+
+
+def select(data, ranks):
+    # in-place partition of the (rows, n) view at the sorted ranks, one kth per
+    # np.partition call: numpy handles a single kth far faster than a kth list
+    if len(ranks) == 0:
+        return
+    mid = len(ranks) // 2
+    k = ranks[mid]
+    data.partition(k, axis=1)
+    select(data[:, :k], ranks[:mid])
+    select(data[:, k + 1:], [rank - k - 1 for rank in ranks[mid + 1:]])
+
+
+def get_estimators(data):
+    # data is a (rows, n) matrix, one replicate per row, in which every column
+    # from get_ranks holds its order statistic and the columns between them hold
+    # the values of that rank range (a full sort or select at those ranks)
+    num = data.shape[1]
+    r = num // 4
+
+    def quantile(q):
+        lo, hi, frac = get_quantile_ranks(num, q)
+        return data[:, lo] + frac * (data[:, hi] - data[:, lo])
+
+    return {
+        "mean": data.mean(axis=1),
+        "median": (data[:, (num - 1) // 2] + data[:, num // 2]) / 2,
+        "z_R": (data[:, 0] + data[:, -1]) / 2,
+        "z_Q": (quantile(0.25) + quantile(0.75)) / 2,
+        "z_tr": data[:, r:num - r].sum(axis=1) / (num - 2 * r),
+    }
+
+
+def get_chunk_rows(num, iters, max_memory):
+    # how many replicates of size num fit into max_memory bytes of float64
+    return int(min(iters, max(1, max_memory // (8 * num))))
+
+
+def accumulate(data, selection=False):
+    data = np.asarray(data, dtype=float)
+    if selection:
+        select(data, get_ranks(data.shape[1]))
+    else:
+        data.sort(axis=1)
+    return {name: Accumulator().add(values) for name, values in get_estimators(data).items()}
+
+
+def summarize(estimates):
+    c = dict()
+    for name in ESTIMATORS:
+        e, d = estimates[name].mean, estimates[name].variance
+        c[name] = round(e, 4)
+        c["d_" + name] = round(d, 4)
+        c[name + "+"] = (
                 "["
-                + str(round(np.mean(z_tr) - np.std(z_tr), 4))
+                + str(round(e - np.sqrt(d), 4))
                 + "; "
-                + str(round(np.mean(z_tr) + np.std(z_tr), 4))
+                + str(round(e + np.sqrt(d), 4))
                 + "]"
         )
+    return c
+
+
+def get_characteristics(generator, sample_size, iters=1000, max_memory=2 ** 27, selection=False):
+    cs = dict()
+    for num in sample_size:
+        estimates = {name: Accumulator() for name in ESTIMATORS}
+        chunk = get_chunk_rows(num, iters, max_memory)
+        for start in range(0, iters, chunk):
+            for name, acc in accumulate(
+                    generator((min(chunk, iters - start), num)), selection
+            ).items():
+                estimates[name].merge(acc)
+        cs[num] = summarize(estimates)
     return cs
 
 
-def chars():
+# rng is either the np.random module or a np.random.Generator
+DISTRIBUTIONS = {
+    "normal": lambda rng, size: rng.standard_normal(size=size),
+    "cauchy": lambda rng, size: rng.standard_cauchy(size=size),
+    "laplace": lambda rng, size: rng.laplace(loc=0, scale=1.0 / np.sqrt(2.0), size=size),
+    "poisson": lambda rng, size: rng.poisson(lam=10, size=size),
+    "uniform": lambda rng, size: rng.uniform(low=-np.sqrt(3.0), high=np.sqrt(3.0), size=size),
+}
+
+
+def simulate_chunk(task):
+    # one pool task: rows replicates from their own seed, generated in blocks that
+    # stay under max_memory
+    dist, num, rows, seed, selection, max_memory = task
+    rng = np.random.default_rng(seed)
+    estimates = {name: Accumulator() for name in ESTIMATORS}
+    chunk = get_chunk_rows(num, rows, max_memory)
+    for start in range(0, rows, chunk):
+        for name, acc in accumulate(
+                DISTRIBUTIONS[dist](rng, (min(chunk, rows - start), num)), selection
+        ).items():
+            estimates[name].merge(acc)
+    return estimates
+
+
+def parallel_chars(sample_size, iters, max_memory, workers, seed, selection, task_rows):
+    # every (distribution, n) cell is split into tasks of task_rows replicates, each
+    # with its own child of one SeedSequence, so the result depends on the seed and
+    # task_rows but not on the worker count or max_memory
+    cells = [(dist, num) for dist in DISTRIBUTIONS for num in sample_size]
+    tasks, owners = [], []
+    for (dist, num), cell_seed in zip(cells, np.random.SeedSequence(seed).spawn(len(cells))):
+        starts = range(0, iters, task_rows)
+        for start, task_seed in zip(starts, cell_seed.spawn(len(starts))):
+            tasks.append((dist, num, min(task_rows, iters - start), task_seed, selection, max_memory))
+            owners.append((dist, num))
+
+    estimates = {cell: {name: Accumulator() for name in ESTIMATORS} for cell in cells}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for cell, result in zip(owners, executor.map(simulate_chunk, tasks, chunksize=4)):
+            for name, acc in result.items():
+                estimates[cell][name].merge(acc)
+
+    cs = {dist: dict() for dist in DISTRIBUTIONS}
+    for (dist, num), estimate in estimates.items():
+        cs[dist][num] = summarize(estimate)
+    return cs
+
+
+def chars(iters=1000, max_memory=2 ** 27, workers=None, seed=None, selection=False, task_rows=50):
     sample_size = (10, 100, 1000)
+    if workers is not None:
+        return parallel_chars(sample_size, iters, max_memory, workers, seed, selection, task_rows)
     cs = dict()
-    cs["normal"] = get_characteristics(np.random.standard_normal, sample_size)
-
-    cs["cauchy"] = get_characteristics(np.random.standard_cauchy, sample_size)
-    cs["laplace"] = get_characteristics(
-        lambda n: np.random.laplace(loc=0, scale=1.0 / np.sqrt(2.0), size=n),
-        sample_size,
-    )
-    cs["poisson"] = get_characteristics(
-        lambda n: np.random.poisson(lam=10, size=n), sample_size
-    )
-    cs["uniform"] = get_characteristics(
-        lambda n: np.random.uniform(low=-np.sqrt(3.0), high=np.sqrt(3.0), size=n),
-        sample_size,
-    )
+    for dist, generator in DISTRIBUTIONS.items():
+        cs[dist] = get_characteristics(
+            lambda size: generator(np.random, size), sample_size, iters, max_memory, selection
+        )
     return cs
 
 
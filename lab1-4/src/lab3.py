@@ -14,21 +14,36 @@ def boxplot(data, title):
     plt.savefig(pathlib.Path(f"../images/boxplots/{title}.png"))
 
 
+def get_outlier_shares(data):
+    # data is a (rows, n) matrix, one sample per row
+    q1, q3 = np.quantile(data, [0.25, 0.75], axis=1, keepdims=True)
+    x1 = q1 - 1.5 * (q3 - q1)
+    x2 = q3 + 1.5 * (q3 - q1)
+    return np.count_nonzero((data < x1) | (x2 < data), axis=1) / data.shape[1]
+
+
 def outlier(data):
-    num = 0
+    return round(get_outlier_shares(np.asarray(data)[np.newaxis, :])[0], 2)
 
-    for i in range(1000):
-        q1 = np.quantile(data, 0.25)
-        q3 = np.quantile(data, 0.75)
-        x1 = q1 - 1.5 * (q3 - q1)
-        x2 = q1 + 1.5 * (q3 - q1)
-        num += np.count_nonzero((data < x1) | (x2 < data)) / len(data)
 
-    return round(num / 1000, 2)
+def simulate_outlier(generator, size, repeats=1000, chunk=10 ** 5):
+    shares = np.concatenate([
+        get_outlier_shares(generator((min(chunk, repeats - start), size)))
+        for start in range(0, repeats, chunk)
+    ])
+    return shares.mean(), shares.std(ddof=1) / np.sqrt(repeats)
 
 
 if __name__ == "__main__":
     outliers = dict()
+    simulated = dict()
+    generators = {
+        "normal": np.random.standard_normal,
+        "cauchy": np.random.standard_cauchy,
+        "laplace": lambda size: np.random.laplace(loc=0, scale=1.0 / np.sqrt(2.0), size=size),
+        "poisson": lambda size: np.random.poisson(lam=10, size=size),
+        "uniform": lambda size: np.random.uniform(low=-np.sqrt(3.0), high=np.sqrt(3.0), size=size),
+    }
 
     d20, d100 = np.random.standard_normal(20), np.random.standard_normal(100)
     boxplot([d20, d100], "normal")
@@ -55,3 +70,10 @@ if __name__ == "__main__":
 
     # print(outliers)
 
+    # drawn after the boxplot samples so that they keep their place in the stream
+    for dist, generator in generators.items():
+        simulated[dist] = {str(n): simulate_outlier(generator, n) for n in (20, 100)}
+    for dist, shares in simulated.items():
+        for n, (mean, se) in shares.items():
+            print("{} n = {}: outlier share {:.4f} \u00b1 {:.4f}".format(dist, n, mean, se))
+
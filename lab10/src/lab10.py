@@ -1,10 +1,27 @@
 import numpy as np
-import pyp as pyp
 import scipy.stats as sps
 import matplotlib.pyplot as plt
 import math as m
 import scipy.optimize as opt
+import scipy.sparse as sparse
 import pandas as pd
+import os
+import sys
+import hashlib
+import glob
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "common"))
+from intervals import jaccard
+from channels import read_channel
 
 
 def plot_data(data):
@@ -32,27 +49,33 @@ def diagram(data, epsilon, beta):
     # plt.show()
 
 
-def minimization(A, y, eps, lim):
+def get_constraints(A, eps):
     [m, n] = A.shape
 
-    c = np.concatenate((np.zeros((n, 1)), np.ones((m, 1))), axis=0)
-    c = np.ravel(c)
+    diag = sparse.diags(np.full(m, -eps))
+    A = sparse.csr_matrix(A)
 
-    diag = np.diag(np.full(m, -eps))
+    return sparse.vstack(
+        (sparse.hstack((-A, diag)), sparse.hstack((A, diag))), format="csr"
+    )
 
-    M_1 = np.concatenate((-A, diag), axis=1)
-    M_2 = np.concatenate((A, diag), axis=1)
-    M = np.concatenate((M_1, M_2), axis=0)
 
-    v = np.concatenate((-y, y), axis=0)
+def minimization(A, y, eps, lim):
+    [m, n] = A.shape
+
+    c = np.concatenate((np.zeros(n), np.ones(m)))
 
-    l_b = np.concatenate((np.full(n, None), np.full(m, lim)), axis=0)
-    print(l_b)
-    u_b = np.full(n + m, None)
+    M = get_constraints(A, eps)
+
+    v = np.concatenate((-y, y), axis=0)
 
-    bounds = [(l_b[i], u_b[i]) for i in range(len(l_b))]
+    bounds = np.full((n + m, 2), np.inf)
+    bounds[:, 0] = -np.inf
+    bounds[n:, 0] = lim
 
-    result = opt.linprog(c=c, A_ub=M, b_ub=v, bounds=bounds)
+    result = opt.linprog(c=c, A_ub=M, b_ub=v, bounds=bounds, method="highs")
+    if result.status != 0:
+        raise RuntimeError(f"minimization failed for lim={lim}: {result.message}")
     y = result.x
 
     coefs = y[0:n]
@@ -61,27 +84,102 @@ def minimization(A, y, eps, lim):
     return [coefs, w]
 
 
-def parser(lim):
-    data = pd.read_csv("../data/Channel_1_700nm_0.2.csv", sep=";", encoding="cp1251")
-
-    print(data)
-    data_mv = np.ravel(data.drop("mA", axis=1).to_numpy())
+def minimization_sweep(A, y, eps, lims):
+    # one LP per lim; only the lower bounds of w change between the solves, so
+    # with highspy every solve starts from the previous optimal basis
+    [m, n] = A.shape
+    coefs = np.empty((len(lims), n))
+    w = np.empty((len(lims), m))
+
+    if len(lims) == 0:
+        return coefs, w
+    if highspy is None:
+        for k, lim in enumerate(lims):
+            coefs[k], w[k] = minimization(A, y, eps, lim)
+        return coefs, w
+
+    M = get_constraints(A, eps).tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_ = n + m
+    lp.num_row_ = 2 * m
+    lp.col_cost_ = np.concatenate((np.zeros(n), np.ones(m)))
+    lp.col_lower_ = np.concatenate((np.full(n, -highspy.kHighsInf), np.full(m, lims[0])))
+    lp.col_upper_ = np.full(n + m, highspy.kHighsInf)
+    lp.row_lower_ = np.full(2 * m, -highspy.kHighsInf)
+    lp.row_upper_ = np.concatenate((-y, y), axis=0)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = M.indptr
+    lp.a_matrix_.index_ = M.indices
+    lp.a_matrix_.value_ = M.data
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    h.passModel(lp)
+
+    columns = np.arange(n, n + m, dtype=np.int32)
+    upper = np.full(m, highspy.kHighsInf)
+    for k, lim in enumerate(lims):
+        # a rejected bound change keeps the previous bounds, which would solve fine
+        if h.changeColsBounds(m, columns, np.full(m, lim, dtype=float), upper) != highspy.HighsStatus.kOk:
+            raise RuntimeError(f"minimization failed for lim={lim}: invalid bounds")
+        h.run()
+        status = h.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError(f"minimization failed for lim={lim}: {h.modelStatusToString(status)}")
+        x = np.array(h.getSolution().col_value)
+        coefs[k], w[k] = x[0:n], x[n : n + m]
+    return coefs, w
+
+
+def load_channel(filename="../data/Channel_1_700nm_0.2.csv"):
+    data_mv = read_channel(filename)["mB"]
 
     data_n = np.arange(1, len(data_mv) + 1, 1)
 
-    data_eps = 1e-4
-
     data_X = np.stack((np.ones(len(data_mv)), data_n))
     data_X = np.transpose(data_X)
+    return data_X, data_mv
+
+
+def sweep(lims, filename="../data/Channel_1_700nm_0.2.csv", data_eps=1e-4):
+    data_X, data_mv = load_channel(filename)
+    return minimization_sweep(data_X, data_mv, data_eps, lims)
+
+
+def get_artifact_path(data, *params, directory="../data/cache"):
+    # content address: hash of the fitted values themselves and of the solver
+    # parameters, so an artifact can only be reused for exactly the data it holds
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(data, dtype=np.float64))
+    digest.update(repr(params).encode())
+    return Path(directory) / f"{digest.hexdigest()}.npy"
+
+
+def parser(lim, filename="../data/Channel_1_700nm_0.2.csv"):
+    data_eps = 1e-4
+
+    data_X, data_mv = load_channel(filename)
+
+    path = get_artifact_path(data_mv, "minimization", float(lim), data_eps)
+    if path.exists():
+        return path
+
     [data_tau, data_w] = minimization(data_X, data_mv, data_eps, lim)
 
-    with open(f"../data/Chi{lim}.txt", "w") as f:
-        print(f"{data_tau[0]} {data_tau[1]}", file=f)
-        for temp in data_w:
-            print(temp, file=f)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(".tmp")
+    with open(temp, "wb") as f:
+        np.save(f, np.concatenate((data_tau, data_w)))
+    os.replace(temp, path)
+    return path
 
 
 def load_processed(filename):
+    if Path(filename).suffix == ".npy":
+        # the stored vector is [A, B, w...]; w is a read-only view into the mapped file
+        result = np.load(filename, mmap_mode="r")
+        return float(result[0]), float(result[1]), result[2:]
+
     A = 0
     B = 0
     w = []
@@ -93,73 +191,173 @@ def load_processed(filename):
 
 
 def subinterval_frequencies_and_mode(A, B, eps, data):
-    y = []
-    for i in range(0, len(data)):
-        y.append(data[i] + eps - (A + B * i))
-        y.append(data[i] - eps - (A + B * i))
-
-    y = list(set(y))
-    y.sort()
-
-    z = []
-
-    for i in range(0, len(y) - 1):
-        z.append([y[i], y[i + 1]])
-
-    max_mu = 0
-    coefs = []
-    mus = []
+    data = np.asarray(data, dtype=float)
+    line = A + B * np.arange(len(data))
+    lower = np.sort(data - eps - line)
+    upper = np.sort(data + eps - line)
 
-    for i in range(0, len(z)):
-        mu = 0
-        for j in range(0, len(data)):
-            if (
-                data[j] - eps - (A + B * j) <= z[i][0]
-                and data[j] + eps - (A + B * j) >= z[i][1]
-            ):
-                mu += 1
-        mus.append(mu)
+    y = np.unique(np.concatenate((lower, upper)))
 
-        if mu > max_mu:
-            max_mu = mu
-            coefs = []
-            coefs.append(i)
-
-        if mu == max_mu:
-            coefs.append(i)
-
-    mode = []
-
-    for i in range(0, len(z)):
-        if i in coefs:
-            mode.append(z[i])
-
-    for k in range(0, len(mode) - 1):
-        if mode[k][1] == mode[k + 1][0]:
-            mode[k] = [mode[k][0], mode[k + 1][1]]
-
-    return mode, max_mu, z, mus
+    z = np.stack((y[:-1], y[1:]), axis=1)
 
+    # an interval covers [y_i, y_{i+1}] iff it starts at or before y_i and
+    # ends after it: count the lower ends minus the upper ends up to y_i
+    mus = np.searchsorted(lower, y[:-1], side="right") - np.searchsorted(
+        upper, y[:-1], side="right"
+    )
 
-def Jakar_coeff(A, B, eps, data):
-    min_inc, max_inc = [], []
-    min_inc.append(data[0] - eps - A)
-    min_inc.append(data[0] + eps - A)
-    max_inc.append(data[0] - eps - A)
-    max_inc.append(data[0] + eps - A)
-    for i in range(0, len(data)):
-        min_inc[0] = max(min_inc[0], data[i] - eps - (A + B * i))
-        min_inc[1] = min(min_inc[1], data[i] + eps - (A + B * i))
-        max_inc[0] = min(max_inc[0], data[i] - eps - (A + B * i))
-        max_inc[1] = max(max_inc[1], data[i] + eps - (A + B * i))
-    JK = (min_inc[1] - min_inc[0]) / (max_inc[1] - max_inc[0])
-    return JK
+    max_mu = int(mus.max())
+
+    mode = z[mus == max_mu]
+
+    adjacent = np.flatnonzero(mode[:-1, 1] == mode[1:, 0])
+    merged = mode.copy()
+    merged[adjacent, 1] = mode[adjacent + 1, 1]
+
+    return merged.tolist(), max_mu, z, mus
+
+
+def Jakar_coeff(A, B, eps, data, chunk=2 ** 24):
+    # A and B may be arrays of candidate lines; chunk caps the number of
+    # residual bounds held in memory at once
+    data = np.asarray(data, dtype=float)
+    A, B = np.broadcast_arrays(np.asarray(A, dtype=float), np.asarray(B, dtype=float))
+    n = np.arange(len(data))
+    rows = max(1, chunk // len(data))
+    JK = np.empty(A.size)
+    for start in range(0, A.size, rows):
+        line = (
+            A.ravel()[start : start + rows, np.newaxis]
+            + B.ravel()[start : start + rows, np.newaxis] * n
+        )
+        JK[start : start + rows] = jaccard(data - eps - line, data + eps - line)
+    return JK.reshape(A.shape)[()]
+
+
+def halfplane_intersection(A, b, tol=1e-12):
+    # vertices, in counterclockwise order, of the polygon {x : A x <= b} in the
+    # plane; empty when the intersection is empty or unbounded
+    A = np.asarray(A, dtype=float)
+    b = np.asarray(b, dtype=float)
+    norms = np.hypot(A[:, 0], A[:, 1])
+    # the boundary of a_k x <= b_k runs along (-a_k1, a_k0) with the region on its left
+    angles = np.arctan2(A[:, 0], -A[:, 1])
+    order = np.lexsort((b / norms, angles))
+    first = np.concatenate(([True], np.diff(angles[order]) > 0))
+    lines = order[first].tolist()
+
+    # plain floats: the sweep below is scalar work, where numpy scalars are slow
+    a0, a1, c, norm = A[:, 0].tolist(), A[:, 1].tolist(), b.tolist(), norms.tolist()
+
+    def intersect(i, j):
+        det = a0[i] * a1[j] - a1[i] * a0[j]
+        if det == 0:
+            return None
+        return (c[i] * a1[j] - a1[i] * c[j]) / det, (a0[i] * c[j] - c[i] * a0[j]) / det
+
+    def outside(k, point):
+        if point is None:
+            return True
+        x, y = point
+        return a0[k] * x + a1[k] * y - c[k] > tol * (abs(c[k]) + norm[k] * m.hypot(x, y))
+
+    hull = deque()
+    for k in lines:
+        while len(hull) >= 2 and outside(k, intersect(hull[-1], hull[-2])):
+            hull.pop()
+        while len(hull) >= 2 and outside(k, intersect(hull[0], hull[1])):
+            hull.popleft()
+        hull.append(k)
+    while len(hull) >= 3 and outside(hull[0], intersect(hull[-1], hull[-2])):
+        hull.pop()
+    while len(hull) >= 3 and outside(hull[-1], intersect(hull[0], hull[1])):
+        hull.popleft()
+
+    if len(hull) < 3:
+        return np.empty((0, 2))
+    vertices = [intersect(hull[k], hull[(k + 1) % len(hull)]) for k in range(len(hull))]
+    if any(v is None for v in vertices):
+        return np.empty((0, 2))
+    vertices = np.array(vertices)
+    # a region open on one side leaves consecutive lines turning by pi or more
+    turns = np.diff(np.append(angles[list(hull)], angles[hull[0]] + 2 * np.pi))
+    if np.any(turns >= np.pi):
+        return np.empty((0, 2))
+    return vertices
+
+
+def information_set(eps, data):
+    # polygon of the (beta_0, beta_1) consistent with every |data[i] - beta_0 - beta_1 i| <= eps
+    data = np.asarray(data, dtype=float)
+    n = np.arange(len(data))
+    A = np.empty((2 * len(data), 2))
+    A[0::2, 0], A[0::2, 1] = 1, n
+    A[1::2, 0], A[1::2, 1] = -1, -n
+    b = np.empty(2 * len(data))
+    b[0::2] = data + eps
+    b[1::2] = -data + eps
+    vertices = halfplane_intersection(A, b)
+    x, y = vertices[:, 0], vertices[:, 1]
+    area = abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+    if len(vertices) == 0:
+        return vertices, area, None
+    bounds = [[x.min(), x.max()], [y.min(), y.max()]]
+    return vertices, area, bounds
+
+
+def analyse_channel(filename, lim=1, eps=10e-4):
+    # the whole single-channel analysis of __main__, without the plots
+    row = {"file": str(filename)}
+    try:
+        data = read_channel(filename)["mB"]
+        A, B, w = load_processed(parser(lim, filename))
+        mode, max_mu, z, mus = subinterval_frequencies_and_mode(A, B, eps, data)
+        vertices, area, bounds = information_set(eps, data)
+        row.update(
+            n=len(data),
+            A=A,
+            B=B,
+            w_sum=float(np.sum(w)),
+            mode_min=mode[0][0],
+            mode_max=mode[-1][1],
+            max_mu=max_mu,
+            jaccard=float(Jakar_coeff(A, B, eps, data)),
+            area=area,
+        )
+        if bounds is not None:
+            row.update(
+                beta_0_min=bounds[0][0],
+                beta_0_max=bounds[0][1],
+                beta_1_min=bounds[1][0],
+                beta_1_max=bounds[1][1],
+            )
+    except Exception as e:
+        row["error"] = repr(e)
+    return row
+
+
+def batch(pattern, output="../data/summary.csv", lim=1, eps=10e-4, workers=None):
+    # pattern is a directory of channel CSVs or a glob; one summary row per file
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    files = sorted(glob.glob(pattern))
+    if os.path.exists(output):
+        # a previous summary may match the pattern itself
+        files = [f for f in files if not os.path.samefile(f, output)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = list(executor.map(analyse_channel, files, repeat(lim), repeat(eps)))
+    summary = pd.DataFrame(rows)
+    summary.to_csv(output, sep=";", index=False)
+    return summary
 
 
 if __name__ == "__main__":
-    data = pd.read_csv("../data/Channel_1_700nm_0.2.csv", sep=";", encoding="cp1251")
+    if len(sys.argv) > 1:
+        print(batch(sys.argv[1]))
+        sys.exit()
+
+    data = pd.Series(read_channel("../data/Channel_1_700nm_0.2.csv")["mB"], name="mB")
     eps = 10e-4
-    data = data["mB"]
     interval_data = []
     for i in range(0, len(data)):
         interval_data.append([data[i] - eps, data[i] + eps])
@@ -167,8 +365,7 @@ if __name__ == "__main__":
     plot_data(data)
     diagram(data, eps, None)
 
-    parser(1)
-    A1, B1, w1 = load_processed("../data/Chi1.txt")
+    A1, B1, w1 = load_processed(parser(1))
     print([A1, B1])
     print(np.sum(w1))
     plt.fill_between(
@@ -192,8 +389,7 @@ if __name__ == "__main__":
     plt.show()
     plt.close()
 
-    parser(0)
-    A0, B0, w0 = load_processed("../data/Chi0.txt")
+    A0, B0, w0 = load_processed(parser(0))
     print(w0)
     print([A0, B0])
     print(np.sum(w0))
@@ -288,20 +484,9 @@ if __name__ == "__main__":
     J1 = Jakar_coeff(A1, B1, eps, data)
     print(f"Ji_0 = {J0}, Ji_1 = {J1}")
 
-    A, b = [], []
-    for i in range(0, len(data)):
-        A.append([1, i])
-        A.append([-1, -i])
-        b.append(data[i] + eps)
-        b.append(-data[i] + eps)
-    A = np.array(A)
-    b = np.array(b)
-    vertices = np.array(pyp.compute_polytope_vertices(A, b))
-
-    beta_0_min = min(vertices[:, 0])
-    beta_0_max = max(vertices[:, 0])
-    beta_1_min = min(vertices[:, 1])
-    beta_1_max = max(vertices[:, 1])
+    vertices, area, bounds = information_set(eps, data)
+    [beta_0_min, beta_0_max], [beta_1_min, beta_1_max] = bounds
 
     print(f"beta_0 in [{beta_0_min},{beta_0_max}]")
     print(f"beta_1 in [{beta_1_min},{beta_1_max}]")
+    print(f"area = {area}")
@@ -1,50 +1,87 @@
 import scipy.stats as stats
 import numpy as np
 import matplotlib.pyplot as plt
-import statistics
 from tabulate import tabulate
 import matplotlib.transforms as transforms
 from matplotlib.patches import Ellipse
 from pathlib import Path
+from collections import OrderedDict
 
 
-def get_two_dim_normal_sample(size, rho, mu=[0, 0], d=[1.0, 1.0]):
+class NormalSampler:
+    # draws from N(mu, cov), keeping the factors of the last maxsize covariances
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.factors = OrderedDict()
+
+    def factor(self, cov):
+        key = tuple(map(tuple, np.asarray(cov, dtype=float)))
+        if key in self.factors:
+            self.factors.move_to_end(key)
+            return self.factors[key]
+        try:
+            factor = np.linalg.cholesky(cov)
+        except np.linalg.LinAlgError:
+            # singular covariance (|rho| = 1): fall back to the symmetric square root
+            w, v = np.linalg.eigh(cov)
+            factor = v * np.sqrt(np.clip(w, 0, None))
+        self.factors[key] = factor
+        if len(self.factors) > self.maxsize:
+            self.factors.popitem(last=False)
+        return factor
+
+    def rvs(self, mu, cov, size, repeats=None):
+        shape = (size, len(mu)) if repeats is None else (repeats, size, len(mu))
+        return np.random.standard_normal(shape) @ self.factor(cov).T + np.asarray(mu, dtype=float)
+
+
+sampler = NormalSampler()
+
+
+def get_two_dim_normal_sample(size, rho, mu=[0, 0], d=[1.0, 1.0], repeats=None):
     cov_matrix = [[d[0], rho], [rho, d[1]]]
-    return stats.multivariate_normal.rvs(mu, cov_matrix, size=size)
+    return sampler.rvs(mu, cov_matrix, size, repeats)
 
 
-def get_mix_two_dim_normal_sample(size, rho):
-    return 0.9 * get_two_dim_normal_sample(size, 0.9) + 0.1 * get_two_dim_normal_sample(
-        size, -0.9, d=[10, 10]
-    )
+def get_mix_two_dim_normal_sample(size, rho, repeats=None):
+    # 0.9 * N(0, C(0.9)) + 0.1 * N(0, C(-0.9, d=10)) of independent terms is itself
+    # normal with covariance 0.81 * C(0.9) + 0.01 * C(-0.9, d=10)
+    cov_matrix = 0.81 * np.array([[1.0, 0.9], [0.9, 1.0]]) + 0.01 * np.array([[10.0, -0.9], [-0.9, 10.0]])
+    return sampler.rvs([0, 0], cov_matrix, size, repeats)
+
+
+def get_pearson_coeffs(x, y):
+    # x and y are (repeats, size) matrices, one sample per row
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    return np.sum(x * y, axis=1) / np.sqrt(np.sum(x * x, axis=1) * np.sum(y * y, axis=1))
+
+
+def get_spearman_coeffs(x, y):
+    # ties get their average rank, as in stats.spearmanr
+    return get_pearson_coeffs(stats.rankdata(x, axis=1), stats.rankdata(y, axis=1))
+
+
+def get_quadrant_coeffs(x, y):
+    # points in the first and third quadrants around the medians count +1, the rest -1
+    upper_x = x >= np.median(x, axis=1, keepdims=True)
+    upper_y = y >= np.median(y, axis=1, keepdims=True)
+    return 2 * np.mean(upper_x == upper_y, axis=1) - 1
 
 
 def get_quadrant_coeff(x, y):
-    size = len(x)
-    median_x = np.median(x)
-    median_y = np.median(y)
-    n = [0, 0, 0, 0]
-    for i in range(size):
-        if x[i] >= median_x and y[i] >= median_y:
-            n[0] += 1
-        elif x[i] < median_x and y[i] >= median_y:
-            n[1] += 1
-        elif x[i] < median_x and y[i] < median_y:
-            n[2] += 1
-        elif x[i] >= median_x and y[i] < median_y:
-            n[3] += 1
-    return (n[0] + n[2] - n[1] - n[3]) / size
+    return get_quadrant_coeffs(np.asarray(x)[np.newaxis, :], np.asarray(y)[np.newaxis, :])[0]
+
+
+def get_batch_correlation_coeffs(samples):
+    # samples is a (repeats, size, 2) tensor
+    x, y = samples[:, :, 0], samples[:, :, 1]
+    return get_pearson_coeffs(x, y), get_spearman_coeffs(x, y), get_quadrant_coeffs(x, y)
 
 
 def get_correlation_coeffs(get_sample, size, rho, repeats):
-    pearson, quadrant, spearman = [], [], []
-    for i in range(repeats):
-        sample = get_sample(size, rho)
-        x, y = sample[:, 0], sample[:, 1]
-        pearson.append(stats.pearsonr(x, y)[0])
-        spearman.append(stats.spearmanr(x, y)[0])
-        quadrant.append(get_quadrant_coeff(x, y))
-    return pearson, spearman, quadrant
+    samples = get_sample(size, rho, repeats=repeats)
+    return get_batch_correlation_coeffs(samples)
 
 
 def create_table(pearson, spearman, quadrant, size, repeats, rho=None):
@@ -64,9 +101,9 @@ def create_table(pearson, spearman, quadrant, size, repeats, rho=None):
         ]
     )
 
-    p = np.median([pearson[k] ** 2 for k in range(repeats)])
-    s = np.median([spearman[k] ** 2 for k in range(repeats)])
-    q = np.median([quadrant[k] ** 2 for k in range(repeats)])
+    p = np.median(np.square(pearson))
+    s = np.median(np.square(spearman))
+    q = np.median(np.square(quadrant))
     rows.append(
         [
             "E(z^2)",
@@ -76,9 +113,9 @@ def create_table(pearson, spearman, quadrant, size, repeats, rho=None):
         ]
     )
 
-    p = statistics.variance(pearson)
-    s = statistics.variance(spearman)
-    q = statistics.variance(quadrant)
+    p = np.var(pearson, ddof=1)
+    s = np.var(spearman, ddof=1)
+    q = np.var(quadrant, ddof=1)
     rows.append(
         [
             "D(z)",
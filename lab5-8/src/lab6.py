@@ -1,7 +1,9 @@
 import numpy as np
+import pandas as pd
 from scipy import stats
 import matplotlib.pyplot as plt
 import scipy.optimize as opt
+import scipy.sparse as sparse
 from pathlib import Path
 
 
@@ -19,17 +21,101 @@ def LMM(parameters, x, y):
 
 
 def get_MNK_params(x, y):
-    beta_1 = (np.mean(x * y) - np.mean(x) * np.mean(y)) / (
-        np.mean(x * x) - np.mean(x) ** 2
-    )
-    beta_0 = np.mean(y) - beta_1 * np.mean(x)
+    # works along the last axis, so stacked datasets give arrays of parameters;
+    # centring first avoids the cancellation in mean(x * y) - mean(x) * mean(y)
+    x_mean = np.mean(x, axis=-1)
+    y_mean = np.mean(y, axis=-1)
+    dx = x - x_mean[..., np.newaxis]
+    beta_1 = np.sum(dx * (y - y_mean[..., np.newaxis]), axis=-1) / np.sum(dx * dx, axis=-1)
+    beta_0 = y_mean - beta_1 * x_mean
     return beta_0, beta_1
 
 
+class MNKAccumulator:
+    # count, means and centred co-moments of (x, y); chunks and partial fits from
+    # other workers are combined with the pairwise update of Chan et al.
+    def __init__(self, count=0, x_mean=0.0, y_mean=0.0, c_xx=0.0, c_xy=0.0):
+        self.count = count
+        self.x_mean = x_mean
+        self.y_mean = y_mean
+        self.c_xx = c_xx
+        self.c_xy = c_xy
+
+    def merge(self, other):
+        count = self.count + other.count
+        if count == 0:
+            return self
+        dx = other.x_mean - self.x_mean
+        dy = other.y_mean - self.y_mean
+        weight = self.count * other.count / count
+        self.c_xx += other.c_xx + dx * dx * weight
+        self.c_xy += other.c_xy + dx * dy * weight
+        self.x_mean += dx * other.count / count
+        self.y_mean += dy * other.count / count
+        self.count = count
+        return self
+
+    def add(self, x, y):
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        if x.size == 0:
+            return self
+        x_mean, y_mean = x.mean(), y.mean()
+        dx = x - x_mean
+        return self.merge(
+            MNKAccumulator(x.size, x_mean, y_mean, np.sum(dx * dx), np.sum(dx * (y - y_mean)))
+        )
+
+    def params(self):
+        beta_1 = self.c_xy / self.c_xx
+        beta_0 = self.y_mean - beta_1 * self.x_mean
+        return beta_0, beta_1
+
+
+def read_xy_chunks(filename, chunksize=10 ** 6, x="x", y="y", **kwargs):
+    for chunk in pd.read_csv(filename, chunksize=chunksize, usecols=[x, y], **kwargs):
+        yield chunk[x].to_numpy(), chunk[y].to_numpy()
+
+
+def get_MNK_params_from_chunks(chunks):
+    # chunks is any iterable of (x, y) array pairs, e.g. read_xy_chunks(filename)
+    acc = MNKAccumulator()
+    for x, y in chunks:
+        acc.add(x, y)
+    return acc.params()
+
+
+def get_LAD_params(x, y):
+    # Exact least absolute deviations fit along the last axis through the LP dual
+    #   max sum y_i d_i  s.t.  sum d_i = 0, sum x_i d_i = 0, -1 <= d_i <= 1
+    # whose equality constraint multipliers are (alpha_0, alpha_1). Stacked datasets
+    # of shape (k, n) become one block-sparse LP with 2k rows, solved by HiGHS.
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    shape = y.shape[:-1]
+    n = y.shape[-1]
+    x = x.reshape(-1, n)
+    y = y.reshape(-1, n)
+    k = len(y)
+
+    columns = np.arange(k * n)
+    rows = 2 * np.repeat(np.arange(k), n)
+    A = sparse.csr_matrix(
+        (
+            np.concatenate((np.ones(k * n), x.ravel())),
+            (np.concatenate((rows, rows + 1)), np.concatenate((columns, columns))),
+        ),
+        shape=(2 * k, k * n),
+    )
+    result = opt.linprog(-y.ravel(), A_eq=A, b_eq=np.zeros(2 * k), bounds=(-1, 1), method="highs")
+    if result.status != 0:
+        raise RuntimeError(f"LAD fit failed: {result.message}")
+
+    alpha = -result.eqlin.marginals.reshape(k, 2)
+    return alpha[:, 0].reshape(shape)[()], alpha[:, 1].reshape(shape)[()]
+
+
 def get_MNM_params(x, y):
-    beta_0, beta_1 = get_MNK_params(x, y)
-    result = opt.minimize(LMM, [beta_0, beta_1], args=(x, y), method="SLSQP")
-    alpha_0, alpha_1 = result.x
+    alpha_0, alpha_1 = get_LAD_params(x, y)
     return alpha_0, alpha_1
 
 
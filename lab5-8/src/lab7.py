@@ -2,6 +2,7 @@ import numpy as np
 import math as m
 import scipy.stats as stats
 from tabulate import tabulate
+from quantiles import chi2_ppf
 
 
 def get_k(size):
@@ -16,38 +17,30 @@ def calculate(distribution, p, k):
     print("sigma =", np.around(sigma, decimals=2))
 
     limits = np.linspace(-1.1, 1.1, num=k - 1)
-    chi_2 = stats.chi2.ppf(p, k - 1)
+    chi_2 = chi2_ppf(p, k - 1)
     print("chi_2 =", chi_2)
     return limits
 
 
-def get_n_p(distribution, limits, size):
-    p_list = np.array([])
-    n_list = np.array([])
+def get_p(limits):
+    cdf = stats.norm.cdf(limits)
+    return np.diff(np.concatenate(([0], cdf, [1])))
 
-    for i in range(-1, len(limits)):
-        if i != -1:
-            prev_cdf_val = stats.norm.cdf(limits[i])
-        else:
-            prev_cdf_val = 0
-        if i != len(limits) - 1:
-            cur_cdf_val = stats.norm.cdf(limits[i + 1])
-        else:
-            cur_cdf_val = 1
-        p_list = np.append(p_list, cur_cdf_val - prev_cdf_val)
-        if i == -1:
-            n_list = np.append(n_list, len(distribution[distribution <= limits[0]]))
-        elif i == len(limits) - 1:
-            n_list = np.append(n_list, len(distribution[distribution >= limits[-1]]))
-        else:
-            n_list = np.append(
-                n_list,
-                len(
-                    distribution[
-                        (distribution <= limits[i + 1]) & (distribution >= limits[i])
-                        ]
-                ),
-            )
+
+def get_n(distribution, limits):
+    # bin i holds the points in (limits[i - 1], limits[i]], the outer bins are unbounded;
+    # a (repeats, size) matrix gives one row of counts per sample
+    k = len(limits) + 1
+    bins = np.searchsorted(limits, distribution, side="left")
+    if bins.ndim == 1:
+        return np.bincount(bins, minlength=k)
+    bins += k * np.arange(bins.shape[0])[:, np.newaxis]
+    return np.bincount(bins.ravel(), minlength=bins.shape[0] * k).reshape(-1, k)
+
+
+def get_n_p(distribution, limits, size):
+    p_list = get_p(limits)
+    n_list = get_n(distribution, limits)
 
     result = np.divide(
         np.multiply((n_list - size * p_list), (n_list - size * p_list)), p_list * size
@@ -55,6 +48,24 @@ def get_n_p(distribution, limits, size):
     return n_list, p_list, result
 
 
+def get_chi2_statistics(samples, limits):
+    # one chi-square statistic per row of the (repeats, size) matrix
+    size = samples.shape[1]
+    return np.sum(get_n_p(samples, limits, size)[2], axis=1)
+
+
+def simulate_rejection_rates(generator, size, alphas=(0.05,), repeats=10000, chunk=10 ** 5):
+    # share of samples for which the N(0, 1) hypothesis is rejected at each alpha
+    k = get_k(size)
+    limits = np.linspace(-1.1, 1.1, num=k - 1)
+    chi_2 = np.concatenate([
+        get_chi2_statistics(generator((min(chunk, repeats - start), size)), limits)
+        for start in range(0, repeats, chunk)
+    ])
+    critical = chi2_ppf(1 - np.asarray(alphas), k - 1)
+    return {alpha: np.mean(chi_2 > c) for alpha, c in zip(alphas, critical)}
+
+
 def create_table(n_list, p_list, result, size, limits):
     cols = [
         "i",
@@ -118,3 +129,12 @@ if __name__ == "__main__":
     get_table(
         20, stats.uniform.rvs(size=20, loc=-m.sqrt(3), scale=2 * m.sqrt(3)), p, alpha
     )
+
+    generators = {
+        "normal": lambda size: np.random.normal(0, 1, size=size),
+        "laplace": lambda size: stats.laplace.rvs(size=size, scale=1 / m.sqrt(2), loc=0),
+        "uniform": lambda size: stats.uniform.rvs(size=size, loc=-m.sqrt(3), scale=2 * m.sqrt(3)),
+    }
+    for name, generator in generators.items():
+        for size in (20, 100):
+            print(name, size, simulate_rejection_rates(generator, size, (0.01, alpha, 0.1)))
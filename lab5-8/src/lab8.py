@@ -1,17 +1,70 @@
 import numpy as np
-import scipy.stats as stats
 import matplotlib.pyplot as plt
 from pathlib import Path
+from quantiles import t_ppf, chi2_ppf, norm_ppf
 
 
 def dispersion_exp(sample):
-    return np.mean(sample ** 2) - np.mean(sample) ** 2
+    return np.mean(sample ** 2, axis=-1) - np.mean(sample, axis=-1) ** 2
 
 
 def normal(size):
     return np.random.standard_normal(size=size)
 
 
+def get_intervals(x, alpha):
+    # x is a (replicates, n) matrix; every interval is a (replicates, 2) array
+    n = x.shape[-1]
+    m = np.mean(x, axis=-1)
+    s = np.sqrt(dispersion_exp(x))
+
+    t_value = t_ppf(1 - alpha / 2, n - 1)
+    chi2_values = chi2_ppf([1 - alpha / 2, alpha / 2], n - 1)
+    norm_value = norm_ppf(1 - alpha / 2)
+    e = np.mean((x - m[..., np.newaxis]) ** 4, axis=-1) / s ** 4 - 3
+
+    # for heavy tails 1 - u * sqrt((e + 2) / n) can drop below zero, leaving
+    # the asymptotic sigma interval unbounded above
+    lower = 1 - norm_value * np.sqrt((e + 2) / n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s_as_upper = np.where(lower > 0, s / np.sqrt(lower), np.inf)
+
+    return {
+        "m": np.stack([m - s * t_value / np.sqrt(n - 1), m + s * t_value / np.sqrt(n - 1)], axis=-1),
+        "sigma": np.stack([s * np.sqrt(n) / np.sqrt(chi2_values[0]), s * np.sqrt(n) / np.sqrt(chi2_values[1])], axis=-1),
+        "m asymptotic": np.stack([m - s * norm_value / np.sqrt(n), m + s * norm_value / np.sqrt(n)], axis=-1),
+        "sigma asymptotic": np.stack([s / np.sqrt(1 + norm_value * np.sqrt((e + 2) / n)), s_as_upper], axis=-1),
+    }
+
+
+def simulate_coverage(generator, n_set, mean, sigma, alpha=0.05, replicates=10000, chunk=10 ** 6):
+    # coverage share, mean width over the bounded intervals and share of unbounded
+    # intervals for every interval and n; chunk caps the number of sample values
+    # generated at once
+    result = dict()
+    for n in n_set:
+        covered, width, bounded = dict(), dict(), dict()
+        rows = max(1, chunk // n)
+        for start in range(0, replicates, rows):
+            intervals = get_intervals(generator((min(rows, replicates - start), n)), alpha)
+            for name, interval in intervals.items():
+                truth = mean if name.startswith("m") else sigma
+                widths = interval[:, 1] - interval[:, 0]
+                finite = np.isfinite(widths)
+                covered[name] = covered.get(name, 0) + np.sum((interval[:, 0] <= truth) & (truth <= interval[:, 1]))
+                width[name] = width.get(name, 0) + np.sum(widths[finite])
+                bounded[name] = bounded.get(name, 0) + np.sum(finite)
+        result[n] = {
+            name: (
+                covered[name] / replicates,
+                width[name] / bounded[name] if bounded[name] else np.nan,
+                1 - bounded[name] / replicates,
+            )
+            for name in covered
+        }
+    return result
+
+
 def draw_results(x_set, m_all, s_all, number):
     fig, axes = plt.subplots(1, 4)
     axes[0].set_ylim(0, 1)
@@ -58,26 +111,13 @@ if __name__ == "__main__":
     x_set = [x_20, x_100]
 
     alpha = 0.05
+    intervals = [get_intervals(x[np.newaxis, :], alpha) for x in x_set]
+
     m_all = []
     s_all = []
-    for i in range(len(n_set)):
-        n = n_set[i]
-        x = x_set[i]
-
-        m = np.mean(x)
-        s = np.sqrt(dispersion_exp(x))
-
-        t_value = stats.t.ppf(1 - alpha / 2, n - 1)
-        chi2_value = stats.chi2.ppf(1 - alpha / 2, n - 1)
-
-        m1 = [
-            m - s * t_value / np.sqrt(n - 1),
-            m + s * t_value / np.sqrt(n - 1)
-        ]
-        s1 = [
-            s * np.sqrt(n) / np.sqrt(chi2_value),
-            s * np.sqrt(n) / np.sqrt(stats.chi2.ppf(alpha / 2, n - 1))
-        ]
+    for n, interval in zip(n_set, intervals):
+        m1 = interval["m"][0]
+        s1 = interval["sigma"][0]
 
         m_all.append(m1)
         s_all.append(s1)
@@ -91,24 +131,9 @@ if __name__ == "__main__":
 
     m_all = []
     s_all = []
-    for i in range(len(n_set)):
-        n = n_set[i]
-        x = x_set[i]
-
-        m = np.mean(x)
-        s = np.sqrt(dispersion_exp(x))
-
-        norm_value = stats.norm.ppf(1 - alpha / 2)
-        e = (np.sum((x - m) ** 4) / n) / s ** 4 - 3
-
-        m_as = [
-            m - norm_value / np.sqrt(n),
-            m + norm_value / np.sqrt(n)
-        ]
-        s_as = [
-            s / np.sqrt(1 + norm_value * np.sqrt((e + 2) / n)),
-            s / np.sqrt(1 - norm_value * np.sqrt((e + 2) / n))
-        ]
+    for interval in intervals:
+        m_as = interval["m asymptotic"][0]
+        s_as = interval["sigma asymptotic"][0]
 
         m_all.append(m_as)
         s_all.append(s_as)
@@ -117,3 +142,18 @@ if __name__ == "__main__":
         print("sigma asymptotic: {:.2f}, {:.2f}".format(s_as[0], s_as[1]))
 
     draw_results(x_set, m_all, s_all, 2)
+    print()
+
+    distributions = {
+        "normal": (normal, 0, 1),
+        "laplace": (lambda size: np.random.laplace(loc=0, scale=1.0 / np.sqrt(2.0), size=size), 0, 1),
+        "uniform": (lambda size: np.random.uniform(low=-np.sqrt(3.0), high=np.sqrt(3.0), size=size), 0, 1),
+    }
+    for name, (generator, mean, sigma) in distributions.items():
+        for n, coverage in simulate_coverage(generator, n_set, mean, sigma, alpha).items():
+            for interval, (share, width, unbounded) in coverage.items():
+                print(
+                    "{} n: {} {}: coverage {:.3f}, width {:.3f}, unbounded {:.4f}".format(
+                        name, n, interval, share, width, unbounded
+                    )
+                )
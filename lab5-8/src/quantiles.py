@@ -0,0 +1,78 @@
+import numpy as np
+import scipy.stats as stats
+from functools import lru_cache
+
+DISTRIBUTIONS = {"t": stats.t, "chi2": stats.chi2, "norm": stats.norm}
+
+# levels used by two-sided and one-sided tests at the usual alphas
+LEVELS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.9, 0.95, 0.975, 0.99, 0.995)
+MAX_DF = 1000
+
+TABLES = {
+    "t": stats.t.ppf(np.array(LEVELS)[:, np.newaxis], np.arange(1, MAX_DF + 1)),
+    "chi2": stats.chi2.ppf(np.array(LEVELS)[:, np.newaxis], np.arange(1, MAX_DF + 1)),
+    "norm": stats.norm.ppf(np.array(LEVELS))[:, np.newaxis],
+}
+LEVEL_INDEX = {q: i for i, q in enumerate(LEVELS)}
+
+
+@lru_cache(maxsize=4096)
+def cached_ppf(name, q, df):
+    if df is None:
+        return float(DISTRIBUTIONS[name].ppf(q))
+    return float(DISTRIBUTIONS[name].ppf(q, df))
+
+
+def lookup(name, q, df):
+    # table hit for a common level and integer df, the LRU otherwise
+    i = LEVEL_INDEX.get(round(q, 12))
+    if i is not None:
+        if df is None:
+            return TABLES[name][i, 0]
+        if np.isfinite(df) and df == int(df) and 1 <= df <= MAX_DF:
+            return TABLES[name][i, int(df) - 1]
+    return cached_ppf(name, q, df)
+
+
+def ppf(name, q, df=None):
+    # scalars go through lookup; for arrays every table hit is one fancy index and
+    # all the misses are resolved by a single vectorized scipy call
+    if np.ndim(q) == 0 and np.ndim(df) == 0:
+        return float(lookup(name, float(q), None if df is None else float(df)))
+    levels = np.array(LEVELS)
+    if df is None:
+        q = np.asarray(q, dtype=float)
+    else:
+        q, df = np.broadcast_arrays(np.asarray(q, dtype=float), np.asarray(df, dtype=float))
+    rounded = np.round(q, 12)
+    level = np.clip(np.searchsorted(levels, rounded), 0, len(levels) - 1)
+    hit = levels[level] == rounded
+    if df is None:
+        column = np.zeros(q.shape, dtype=int)
+    else:
+        finite = np.isfinite(df)
+        whole = np.where(finite, df, 0)
+        hit &= finite & (whole == np.floor(whole)) & (whole >= 1) & (whole <= MAX_DF)
+        column = np.where(hit, whole, 1).astype(int) - 1
+
+    result = np.empty(q.shape)
+    result[hit] = TABLES[name][level[hit], column[hit]]
+    miss = ~hit
+    if np.any(miss):
+        if df is None:
+            result[miss] = DISTRIBUTIONS[name].ppf(q[miss])
+        else:
+            result[miss] = DISTRIBUTIONS[name].ppf(q[miss], df[miss])
+    return result
+
+
+def t_ppf(q, df):
+    return ppf("t", q, df)
+
+
+def chi2_ppf(q, df):
+    return ppf("chi2", q, df)
+
+
+def norm_ppf(q):
+    return ppf("norm", q)
@@ -3,6 +3,11 @@ import matplotlib.pyplot as plt
 import scipy.optimize as opt
 import pandas as pd
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "common"))
+from intervals import jaccard
+from channels import read_channel
 
 eps = 10e-4
 
@@ -31,27 +36,33 @@ def diagram(data, epsilon, beta):
     plt.ylabel("mV")
     plt.savefig(Path(f"../images/diagram_beta_{beta}.png"))
 
+def in_mode(data, mode):
+    """
+    Mask of the measurements whose eps-interval contains some mode interval.
+
+    The mode intervals are sorted by lower end with a suffix minimum of the upper
+    ends, so one binary search per measurement finds the best candidate.
+    """
+    mode = np.asarray(mode, dtype=float).reshape(-1, 2)
+    order = np.argsort(mode[:, 0])
+    starts = mode[order, 0]
+    ends = np.append(np.minimum.accumulate(mode[order, 1][::-1])[::-1], np.inf)
+    data = np.asarray(data)
+    return ends[np.searchsorted(starts, data - eps, side="left")] <= data + eps
+
 def diagram_with_mode(data, mode):
     """
     Create a diagram plot with mode.
     """
-    data_mode, data_not_mode = [], []
-    index_mode, index_not_mode = [], []
-    for i, d in enumerate(data):
-        in_mode = False
-        for m in mode:
-            if m[0] >= d - eps and m[1] <= d + eps:
-                data_mode.append(d)
-                index_mode.append(i)
-                in_mode = True
-                break
-        if not in_mode:
-            data_not_mode.append(d)
-            index_not_mode.append(i)
+    data = np.asarray(data)
+    index = np.arange(len(data))
+    mask = in_mode(data, mode)
+    data_mode, data_not_mode = data[mask], data[~mask]
+    index_mode, index_not_mode = index[mask], index[~mask]
     plt.figure()
-    plt.fill_between(index_mode, np.array(data_mode) - eps, np.array(data_mode) + eps, color="lightcoral", alpha=0.3)
+    plt.fill_between(index_mode, data_mode - eps, data_mode + eps, color="lightcoral", alpha=0.3)
     plt.plot(index_mode, data_mode, color="brown", linewidth=0.5)
-    plt.fill_between(index_not_mode, np.array(data_not_mode) - eps, np.array(data_not_mode) + eps, color="skyblue", alpha=0.3)
+    plt.fill_between(index_not_mode, data_not_mode - eps, data_not_mode + eps, color="skyblue", alpha=0.3)
     plt.plot(index_not_mode, data_not_mode, color="blue", linewidth=0.5)
     for m in mode:
         plt.plot([0, 199], [m[0], m[0]], color="maroon", linestyle="--", linewidth=0.5)
@@ -71,40 +82,25 @@ def estimators_of_data(data):
 def mode_and_max_click(data):
     """
     Find the mode and maximum number of clicks.
-    """
-    y = []
-    for element in data:
-        y.append(element - eps)
-        y.append(element + eps)
-    y = list(set(y))
-    y.sort()
-    z = []
-    for i in range(len(y) - 1):
-        z.append([y[i], y[i + 1]])
-    max_mu = 0
-    coefs = []
-    for i in range(len(z)):
-        mu = sum(1 for d in data if z[i][0] <= d - eps <= z[i][1] or z[i][0] <= d + eps <= z[i][1])
-        if mu > max_mu:
-            max_mu = mu
-            coefs = []
-            coefs.append(i)
-        if mu == max_mu:
-            coefs.append(i)
-    mode = [z[i] for i in range(len(z)) if i in coefs]
+
+    Sweep over the sorted interval endpoints: the coverage of every elementary
+    subinterval is the number of lower ends minus the number of upper ends
+    passed so far.
+    """
+    lower = np.sort(np.asarray(data) - eps)
+    upper = np.sort(np.asarray(data) + eps)
+    y = np.unique(np.concatenate((lower, upper)))
+    mus = np.searchsorted(lower, y[:-1], side="right") - np.searchsorted(upper, y[:-1], side="right")
+    max_mu = int(mus.max())
+    mode = [[y[i], y[i + 1]] for i in np.flatnonzero(mus == max_mu)]
     return mode, max_mu
 
 def Jakar_coeff(int_data):
     """
     Calculate the Jaccard coefficient.
     """
-    min_inc = [int_data[0][0], int_data[0][1]]
-    for interval in int_data:
-        min_inc[0] = max(min_inc[0], interval[0])
-        min_inc[1] = min(min_inc[1], interval[1])
-    max_inc = [int_data[0][0], int_data[-1][1]]
-    JK = (min_inc[1] - min_inc[0]) / (max_inc[1] - max_inc[0])
-    return JK
+    int_data = np.asarray(int_data, dtype=float)
+    return jaccard(int_data[:, 0], int_data[:, 1])
 
 def relative_width_of_the_mode(int_data, mode):
     """
@@ -113,29 +109,44 @@ def relative_width_of_the_mode(int_data, mode):
     wid_mode = sum(m[1] - m[0] for m in mode)
     return wid_mode / (int_data[-1][1] - int_data[0][0])
 
-def find_oskorbin_center_and_w(data):
+def find_oskorbin_center_and_w(data, rad=None):
     """
     Find the Oskorbin center and width.
+
+    With equal radii eps the smallest w >= 1 that makes all the intervals
+    [d - eps * w, d + eps * w] intersect only depends on the extreme measurements,
+    so it is found in closed form. Per-measurement radii rad go through the LP.
+    When w = 1 the intervals meet in a segment rather than a point; both paths
+    return its midpoint as beta. w and beta are Python floats.
+    """
+    data = np.asarray(data, dtype=float)
+    if rad is None:
+        lo, hi = data.min(), data.max()
+        return float(max(1.0, (hi - lo) / (2 * eps))), float((hi + lo) / 2)
+    rad = np.broadcast_to(np.asarray(rad, dtype=float), data.shape)
+    A = np.empty((2 * len(data), 2))
+    A[:, 0] = -np.repeat(rad, 2)
+    A[0::2, 1] = -1
+    A[1::2, 1] = 1
+    b = np.empty(2 * len(data))
+    b[0::2] = -data
+    b[1::2] = data
+    w = opt.linprog(c=[1, 0], A_ub=A, b_ub=b, bounds=[(1, None), (None, None)], method="highs").x[0]
+    lo, hi = np.max(data - rad * w), np.min(data + rad * w)
+    return float(w), float((hi + lo) / 2)
+
+def oskorbin_windows(data, window):
+    """
+    Find the Oskorbin center and width of every sliding window of the recording.
     """
-    A, b = [], []
-    n = len(data)
-    for i in range(n):
-        A.append([-eps, -1])
-        A.append([-eps, 1])
-    A.append([-1, 0])
-    for d in data:
-        b.append(-d)
-        b.append(d)
-    b.append(-1)
-    c = [1, 0]
-    result = opt.linprog(c=c, A_ub=A, b_ub=b).x
-    w, beta = result
-    return w, beta
+    data = pd.Series(np.asarray(data, dtype=float))
+    lo = data.rolling(window).min().to_numpy()[window - 1:]
+    hi = data.rolling(window).max().to_numpy()[window - 1:]
+    return np.maximum(1.0, (hi - lo) / (2 * eps)), (hi + lo) / 2
 
 if __name__ == "__main__":
-    data = pd.read_csv("../src/data.csv", sep=";", encoding="cp1251")
+    data = pd.Series(read_channel("../src/data.csv")["mB"], name="mB")
     print(data)
-    data = data["mB"]
     interval_data = [[d - eps, d + eps] for d in data]
     plot_data(data)
     print(f"estimators of data = {estimators_of_data(data)}")